@@ -0,0 +1,56 @@
+import json
+import threading
+
+from sqlalchemy import event
+
+from core import db
+from core.coalesce import Coalescer
+from models.movie import Movie
+
+
+def test_overlapping_reads_with_different_ids(app):
+    with app.app_context():
+        first = Movie.create(name='Coalesce 1', year=2001, genre='drama')
+        second = Movie.create(name='Coalesce 2', year=2002, genre='comedy')
+        ids = [first.id, second.id]
+        engine = db.engine
+
+    # both queries have to be in flight at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_other(*args):
+        barrier.wait()
+
+    bodies = {}
+
+    def read(row_id):
+        response = app.test_client().get('/api/movie', data={'id': row_id})
+        bodies[row_id] = (response.status_code, json.loads(response.data))
+
+    event.listen(engine, 'before_cursor_execute', wait_for_other)
+    try:
+        threads = [threading.Thread(target=read, args=(row_id,)) for row_id in ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        event.remove(engine, 'before_cursor_execute', wait_for_other)
+
+    for row_id in ids:
+        status, body = bodies[row_id]
+        assert status == 200
+        assert body['id'] == row_id
+
+
+def test_coalescing_can_be_turned_off(app):
+    coalescer = Coalescer()
+    coalescer.init_app(app)
+    assert coalescer.enabled
+
+    app.config['COALESCE_ENABLED'] = False
+    try:
+        coalescer.init_app(app)
+    finally:
+        del app.config['COALESCE_ENABLED']
+    assert not coalescer.enabled
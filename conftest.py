@@ -0,0 +1,20 @@
+import pytest
+
+from core import create_app, db
+
+# models_test.py is a script against the real postgres db
+collect_ignore = ['models_test.py']
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    # routes are registered on import, so there is one app per test run
+    db_path = tmp_path_factory.mktemp('db') / 'test.db'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{}'.format(db_path),
+        'RATE_LIMIT_ENABLED': False,
+    })
+    yield app
+    with app.app_context():
+        db.drop_all()
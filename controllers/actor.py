@@ -3,24 +3,35 @@ from flask import jsonify, make_response
 from datetime import datetime as dt
 from ast import literal_eval
 
+from core.coalesce import coalescer
 from models.actor import Actor
 from models.movie import Movie
+from models.base import VersionConflict
 from settings.constants import ACTOR_FIELDS  # to make response pretty
-from .parse_request import get_request_data
+from .parse_request import get_request_data, get_request_version
 
 
-def get_all_actors():
+def list_actors():
     """
-    Get list of all records
+    Get list of all records as dicts
     """
     all_actors = Actor.query.all()
     actors = []
     for actor in all_actors:
         act = {k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS}
         actors.append(act)
-    return make_response(jsonify(actors), 200)
+    return actors
+
+
+@coalescer.coalesce
+def get_all_actors():
+    """
+    Get list of all records
+    """
+    return make_response(jsonify(list_actors()), 200)
 
 
+@coalescer.coalesce
 def get_actor_by_id():
     """
     Get record by id
@@ -40,7 +51,9 @@ def get_actor_by_id():
             err = 'Record with such id does not exist'
             return make_response(jsonify(error=err), 400)
 
-        return make_response(jsonify(actor), 200)
+        response = make_response(jsonify(actor), 200)
+        response.set_etag(str(obj.version))
+        return response
 
     else:
         err = 'No id specified'
@@ -54,6 +67,9 @@ def add_actor():
     data = get_request_data()
     ### YOUR CODE HERE ###
 
+    # version is assigned by the db
+    data.pop('version', None)
+
     # Check if all required fields are present
     required_fields = {'name', 'gender', 'date_of_birth'}
     missing_fields = required_fields - set(data.keys())
@@ -98,10 +114,10 @@ def update_actor():
         err = 'Id must be an integer'
         return make_response(jsonify(error=err), 400)
 
-    # Check if the actor record with the given id exists
-    actor = Actor.query.filter_by(id=actor_id).first()
-    if not actor:
-        err = 'Record with such id does not exist'
+    try:
+        version = get_request_version(data)
+    except ValueError:
+        err = 'Version must be an integer'
         return make_response(jsonify(error=err), 400)
 
     # Check if inputted fields exist in ACTOR_FIELDS
@@ -119,10 +135,19 @@ def update_actor():
             err = 'Date of birthday must be in correct format'
             return make_response(jsonify(error=err), 400)
 
-    # update the actor record
-    upd_record = Actor.update(actor_id, **data)
+    # update the actor record (only if nobody changed it since `version`)
+    try:
+        upd_record = Actor.update(actor_id, version=version, **data)
+    except VersionConflict:
+        err = 'Record was modified by another request'
+        return make_response(jsonify(error=err), 409)
+    if not upd_record:
+        err = 'Record with such id does not exist'
+        return make_response(jsonify(error=err), 400)
     upd_actor = {k: v for k, v in upd_record.__dict__.items() if k in ACTOR_FIELDS}
-    return make_response(jsonify(upd_actor), 200)
+    response = make_response(jsonify(upd_actor), 200)
+    response.set_etag(str(upd_record.version))
+    return response
 
     ### END CODE HERE ###
 
@@ -162,6 +187,12 @@ def actor_add_relation():
     data = get_request_data()
     KEY_DICT = {'id', 'relation_id'}
 
+    try:
+        version = get_request_version(data)
+    except ValueError:
+        err = 'Version must be an integer'
+        return make_response(jsonify(error=err), 400)
+
     # Check if all keys in data are correct
     if not set(data.keys()).issubset(KEY_DICT):
         err = 'Wrong key'
@@ -189,10 +220,16 @@ def actor_add_relation():
             return make_response(jsonify(error=err), 400)
 
         # use this for 200 response code
-        actor = Actor.add_relation(actor_id, movie)  # add relation here
+        try:
+            actor = Actor.add_relation(actor_id, movie, version=version)  # add relation here
+        except VersionConflict:
+            err = 'Record was modified by another request'
+            return make_response(jsonify(error=err), 409)
         rel_actor = {k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS}
         rel_actor['filmography'] = str(actor.filmography)
-        return make_response(jsonify(rel_actor), 200)
+        response = make_response(jsonify(rel_actor), 200)
+        response.set_etag(str(actor.version))
+        return response
     else:
         err = 'Both id and relation_id should be specified'
         return make_response(jsonify(error=err), 400)
@@ -216,6 +253,12 @@ def actor_clear_relations():
         err = 'Id must be an integer'
         return make_response(jsonify(error=err), 400)
 
+    try:
+        version = get_request_version(data)
+    except ValueError:
+        err = 'Version must be an integer'
+        return make_response(jsonify(error=err), 400)
+
     # obj = Actor.query.get(actor_id)
     # if not obj:
     #     err = 'Record with such id does not exist'
@@ -228,8 +271,14 @@ def actor_clear_relations():
         return make_response(jsonify(error=err), 400)
 
     # use this for 200 response code
-    actor = Actor.clear_relations(actor_id)  # clear relations here
+    try:
+        actor = Actor.clear_relations(actor_id, version=version)  # clear relations here
+    except VersionConflict:
+        err = 'Record was modified by another request'
+        return make_response(jsonify(error=err), 409)
     rel_actor = {k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS}
     rel_actor['filmography'] = str(actor.filmography)
-    return make_response(jsonify(rel_actor), 200)
+    response = make_response(jsonify(rel_actor), 200)
+    response.set_etag(str(actor.version))
+    return response
     ### END CODE HERE ###
@@ -2,24 +2,35 @@ from flask import jsonify, make_response
 
 from ast import literal_eval
 
+from core.coalesce import coalescer
 from models.actor import Actor
 from models.movie import Movie
+from models.base import VersionConflict
 from settings.constants import MOVIE_FIELDS
-from .parse_request import get_request_data
+from .parse_request import get_request_data, get_request_version
 
 
-def get_all_movies():
+def list_movies():
     """
-    Get list of all records
+    Get list of all records as dicts
     """
     all_movie = Movie.query.all()
     movies = []
     for movie in all_movie:
         mov = {k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS}
         movies.append(mov)
-    return make_response(jsonify(movies), 200)
+    return movies
+
+
+@coalescer.coalesce
+def get_all_movies():
+    """
+    Get list of all records
+    """
+    return make_response(jsonify(list_movies()), 200)
 
 
+@coalescer.coalesce
 def get_movie_by_id():
     """
     Get record by id
@@ -39,7 +50,9 @@ def get_movie_by_id():
             err = 'Record with such id does not exist'
             return make_response(jsonify(error=err), 400)
 
-        return make_response(jsonify(movie), 200)
+        response = make_response(jsonify(movie), 200)
+        response.set_etag(str(obj.version))
+        return response
 
     else:
         err = 'No id specified'
@@ -52,6 +65,9 @@ def add_movie():
     """
     data = get_request_data()
 
+    # version is assigned by the db
+    data.pop('version', None)
+
     required_fields = {'name', 'year', 'genre'}
     missing_fields = required_fields - set(data.keys())
     if missing_fields:
@@ -94,10 +110,10 @@ def update_movie():
         err = 'Id must be integer'
         return make_response(jsonify(error=err), 400)
 
-    # Check if the actor record with the given id exists
-    obj = Movie.query.filter_by(id=movie_id).first()
-    if not obj:
-        err = 'Record with such id does not exist'
+    try:
+        version = get_request_version(data)
+    except ValueError:
+        err = 'Version must be an integer'
         return make_response(jsonify(error=err), 400)
 
     # Check if inputted fields exist
@@ -114,9 +130,18 @@ def update_movie():
             err = 'Year should be an integer'
             return make_response(jsonify(error=err), 400)
 
-    upd_record = Movie.update(movie_id, **data)
+    try:
+        upd_record = Movie.update(movie_id, version=version, **data)
+    except VersionConflict:
+        err = 'Record was modified by another request'
+        return make_response(jsonify(error=err), 409)
+    if not upd_record:
+        err = 'Record with such id does not exist'
+        return make_response(jsonify(error=err), 400)
     upd_movie = {k: v for k, v in upd_record.__dict__.items() if k in MOVIE_FIELDS}
-    return make_response(jsonify(upd_movie), 200)
+    response = make_response(jsonify(upd_movie), 200)
+    response.set_etag(str(upd_record.version))
+    return response
 
 
 def delete_movie():
@@ -153,6 +178,12 @@ def movie_add_relation():
     data = get_request_data()
     KEY_DICT = {'id', 'relation_id'}
 
+    try:
+        version = get_request_version(data)
+    except ValueError:
+        err = 'Version must be an integer'
+        return make_response(jsonify(error=err), 400)
+
     # Check if all keys in data are correct
     if not set(data.keys()).issubset(KEY_DICT):
         err = 'Wrong key'
@@ -180,10 +211,16 @@ def movie_add_relation():
             return make_response(jsonify(error=err), 400)
 
         # use this for 200 response code
-        movie = Movie.add_relation(movie_id, actor)  # add relation here
+        try:
+            movie = Movie.add_relation(movie_id, actor, version=version)  # add relation here
+        except VersionConflict:
+            err = 'Record was modified by another request'
+            return make_response(jsonify(error=err), 409)
         rel_movie = {k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS}
         rel_movie['cast'] = str(movie.cast)
-        return make_response(jsonify(rel_movie), 200)
+        response = make_response(jsonify(rel_movie), 200)
+        response.set_etag(str(movie.version))
+        return response
     else:
         err = 'Both id and relation_id should be specified'
         return make_response(jsonify(error=err), 400)
@@ -206,6 +243,12 @@ def movie_clear_relations():
         err = 'Id must be integer'
         return make_response(jsonify(error=err), 400)
 
+    try:
+        version = get_request_version(data)
+    except ValueError:
+        err = 'Version must be an integer'
+        return make_response(jsonify(error=err), 400)
+
     # Check if the actor record with the given id exists
     obj = Movie.query.filter_by(id=movie_id).first()
     if not obj:
@@ -213,7 +256,13 @@ def movie_clear_relations():
         return make_response(jsonify(error=err), 400)
 
     # use this for 200 response code
-    movie = Movie.clear_relations(movie_id)  # clear relations here
+    try:
+        movie = Movie.clear_relations(movie_id, version=version)  # clear relations here
+    except VersionConflict:
+        err = 'Record was modified by another request'
+        return make_response(jsonify(error=err), 409)
     rel_movie = {k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS}
     rel_movie['cast'] = str(movie.cast)
-    return make_response(jsonify(rel_movie), 200)
+    response = make_response(jsonify(rel_movie), 200)
+    response.set_etag(str(movie.version))
+    return response
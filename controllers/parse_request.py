@@ -7,3 +7,23 @@ def get_request_data():
     """
     data = dict(request.form)
     return data
+
+
+def get_request_version(data):
+    """
+    Get version the client has read, from "version" field or "If-Match" header
+
+    Removes "version" from data, returns int or None if not specified.
+    Raises ValueError if version is not an integer.
+    """
+    version = data.pop('version', None)
+    if version is None:
+        version = request.headers.get('If-Match')
+        if version is None or version.strip() == '*':
+            return None
+        # ETag form: "3" or W/"3"
+        version = version.strip()
+        if version.startswith('W/'):
+            version = version[2:]
+        version = version.strip('"')
+    return int(version)
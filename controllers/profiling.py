@@ -0,0 +1,73 @@
+from flask import jsonify, make_response, request
+
+from core.profiling import profiler
+from .parse_request import get_request_data
+
+
+def is_admin():
+    """
+    Check "X-Admin-Token" header
+    """
+    return profiler.is_admin(request.headers.get('X-Admin-Token'))
+
+
+def get_profiles():
+    """
+    Get list of stored profiles
+    """
+    if not is_admin():
+        err = 'Admin token required'
+        return make_response(jsonify(error=err), 403)
+
+    profiles = [profile.summary() for profile in list(profiler.profiles)]
+    return make_response(jsonify(profiles), 200)
+
+
+def download_profile():
+    """
+    Download profile by id as pstats file or collapsed stacks
+    """
+    if not is_admin():
+        err = 'Admin token required'
+        return make_response(jsonify(error=err), 403)
+
+    data = get_request_data()
+    if 'id' not in data:
+        err = 'No id specified'
+        return make_response(jsonify(error=err), 400)
+
+    try:
+        profile_id = int(data['id'])
+    except ValueError:
+        err = 'Id must be an integer'
+        return make_response(jsonify(error=err), 400)
+
+    profile = profiler.get(profile_id)
+    if not profile:
+        err = 'Profile with such id does not exist'
+        return make_response(jsonify(error=err), 400)
+
+    fmt = data.get('format', 'pstats')
+    if fmt == 'pstats':
+        if profile.stats is None:
+            err = 'Profile has no pstats data (recorded in sampling mode)'
+            return make_response(jsonify(error=err), 400)
+        response = make_response(profile.stats, 200)
+        response.mimetype = 'application/octet-stream'
+        filename = 'profile-{}.pstats'.format(profile.id)
+    elif fmt == 'collapsed':
+        if profile.mode != 'sampling':
+            err = 'Profile has no stacks (recorded in cprofile mode)'
+            return make_response(jsonify(error=err), 400)
+        if not profile.stacks:
+            err = 'Profile has no samples'
+            return make_response(jsonify(error=err), 400)
+        response = make_response(profile.collapsed(), 200)
+        response.mimetype = 'text/plain'
+        filename = 'profile-{}.collapsed'.format(profile.id)
+    else:
+        err = 'Format must be pstats or collapsed'
+        return make_response(jsonify(error=err), 400)
+
+    response.headers['Content-Disposition'] = 'attachment; filename={}'.format(filename)
+    return response
@@ -2,21 +2,39 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 
 from settings.constants import DB_URL
+from .coalesce import coalescer
+from .profiling import profiler
+from .ratelimit import limiter
+from .snapshot import mark_stale
 
 db = SQLAlchemy()
 
 
-def create_app():
+def create_app(config=None):
     """Construct the core application."""
     app = Flask(__name__, instance_relative_config=False)
     app.config['SQLALCHEMY_DATABASE_URI'] = DB_URL
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # silence the deprecation warning
+    app.config.update(config or {})
 
     db.init_app(app)
+    limiter.init_app(app)
+    coalescer.init_app(app)
 
     with app.app_context():
         # Imports
         from . import routes
+        from models.base import write_hooks
+
+        # Reads in flight must not be shared across a write
+        if coalescer.invalidate not in write_hooks:
+            write_hooks.append(coalescer.invalidate)
+        # Collection snapshots are rebuilt after writes to their table
+        if mark_stale not in write_hooks:
+            write_hooks.append(mark_stale)
+
+        # Profiling hooks for views and sql statements
+        profiler.init_app(app, db.engine)
 
         # Create tables for our models
         db.create_all()
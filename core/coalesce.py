@@ -0,0 +1,87 @@
+import threading
+from functools import wraps
+
+from flask import current_app, request
+
+from controllers.parse_request import get_request_data
+from settings.constants import COALESCE_ENABLED
+
+
+class Call(object):
+    """
+    Read in flight, followers wait for `done` and reuse `result`
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # (body, status, headers) once the leader succeeded
+
+
+class Coalescer(object):
+    """
+    Single-flight for read controllers
+
+    Identical reads (same view and params) running at the same time share
+    one query and one encoded body. Every write bumps `generation`, so
+    reads arriving after a write never join a flight started before it.
+    """
+
+    def __init__(self):
+        self.enabled = COALESCE_ENABLED
+        self.calls = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Read settings from app config (keys are the same as in settings.constants)
+        """
+        self.enabled = app.config.get('COALESCE_ENABLED', self.enabled)
+
+    def invalidate(self, *args):
+        """
+        Called after every write (see models.base.write_hooks)
+        """
+        with self.lock:
+            self.generation += 1
+
+    def coalesce(self, view):
+        """
+        Decorator for read controllers
+        """
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return view(*args, **kwargs)
+
+            # same source the controllers read params from
+            params = (tuple(sorted(get_request_data().items())),
+                      tuple(sorted(request.args.items(multi=True))))
+            with self.lock:
+                key = (view.__name__, params, self.generation)
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.calls[key] = Call()
+
+            if leader:
+                try:
+                    response = view(*args, **kwargs)
+                    call.result = (response.get_data(), response.status_code, list(response.headers))
+                    return response
+                finally:
+                    with self.lock:
+                        del self.calls[key]
+                    call.done.set()
+
+            call.done.wait()
+            if call.result is None:
+                # leader failed, do the work ourselves
+                return view(*args, **kwargs)
+            body, status, headers = call.result
+            return current_app.response_class(body, status=status, headers=headers)
+        return wrapper
+
+
+coalescer = Coalescer()
@@ -0,0 +1,222 @@
+import cProfile
+import hmac
+import itertools
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from functools import wraps
+
+from flask import request
+from sqlalchemy import event
+
+from settings.constants import (PROFILING_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_HEADER, PROFILE_MODE,
+                                PROFILE_SAMPLE_INTERVAL, PROFILE_TRACEMALLOC, PROFILE_TOP_ALLOCATIONS,
+                                PROFILE_BUFFER_SIZE, PROFILE_ADMIN_TOKEN)
+
+
+class Profile(object):
+    """
+    Result of one profiled request
+    """
+
+    def __init__(self, profile_id, mode):
+        self.id = profile_id
+        self.mode = mode
+        self.endpoint = request.endpoint
+        self.method = request.method
+        self.path = request.full_path
+        self.started = time.time()
+        self.duration = 0.0
+        self.stats = None  # marshalled pstats data ('cprofile' mode)
+        self.stacks = Counter()  # collapsed stack -> samples ('sampling' mode)
+        self.queries = []  # (statement, ms)
+        self.allocations = []
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'path': self.path,
+            'started': self.started,
+            'duration_ms': round(self.duration * 1000, 3),
+            'queries': [{'statement': s, 'ms': round(ms, 3)} for s, ms in self.queries],
+            'allocations': self.allocations,
+        }
+
+    def collapsed(self):
+        """
+        Stacks in flamegraph collapsed format ("a;b;c count" per line)
+        """
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.items())
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the stack of one thread until stopped
+    """
+
+    def __init__(self, thread_id, stacks, interval):
+        super(Sampler, self).__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = stacks
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{}:{}:{}'.format(code.co_filename, code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        if stack:
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def run(self):
+        # views shorter than the interval get no samples
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Profiler(object):
+    """
+    Opt-in profiling of view functions
+
+    A request is profiled when it carries PROFILE_HEADER with the admin
+    token or is picked at PROFILE_SAMPLE_RATE. Results go to a ring buffer
+    of PROFILE_BUFFER_SIZE profiles.
+    """
+
+    def __init__(self):
+        self.enabled = PROFILING_ENABLED
+        self.sample_rate = PROFILE_SAMPLE_RATE
+        self.mode = PROFILE_MODE
+        self.tracemalloc = PROFILE_TRACEMALLOC
+        self.admin_token = PROFILE_ADMIN_TOKEN
+        self.profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+        self.ids = itertools.count(1)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.tracing = 0  # profiles using tracemalloc right now
+        # cProfile can not run for two threads at once
+        self.cprofile_lock = threading.Lock()
+
+    def init_app(self, app, engine):
+        """
+        Read settings from app config and hook into sqlalchemy engine
+
+        Has to run inside app context.
+        """
+        self.enabled = app.config.get('PROFILING_ENABLED', self.enabled)
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', self.sample_rate)
+        self.mode = app.config.get('PROFILE_MODE', self.mode)
+        self.tracemalloc = app.config.get('PROFILE_TRACEMALLOC', self.tracemalloc)
+        self.admin_token = app.config.get('PROFILE_ADMIN_TOKEN', self.admin_token)
+        self.profiles = deque(maxlen=app.config.get('PROFILE_BUFFER_SIZE', self.profiles.maxlen))
+        if self.enabled and not event.contains(engine, 'before_cursor_execute', self.before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def is_admin(self, token):
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def wanted(self):
+        if self.is_admin(request.headers.get(PROFILE_HEADER)):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self.local, 'profile', None) is not None:
+            self.local.query_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = getattr(self.local, 'profile', None)
+        if profile is not None:
+            profile.queries.append((statement, (time.perf_counter() - self.local.query_start) * 1000))
+
+    def start_tracemalloc(self):
+        with self.lock:
+            if not self.tracing and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.tracing += 1
+        return tracemalloc.take_snapshot()
+
+    def stop_tracemalloc(self, before):
+        after = tracemalloc.take_snapshot()
+        with self.lock:
+            self.tracing -= 1
+            if not self.tracing:
+                tracemalloc.stop()
+        # leave out the profiler's own allocations
+        filters = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+        return [{'location': str(stat.traceback[0]), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+                for stat in stats[:PROFILE_TOP_ALLOCATIONS]]
+
+    def run(self, view, *args, **kwargs):
+        """
+        Call view with profiling
+        """
+        mode = self.mode
+        # fall back to sampling if another request holds cProfile
+        if mode == 'cprofile' and not self.cprofile_lock.acquire(blocking=False):
+            mode = 'sampling'
+        profile = Profile(next(self.ids), mode)
+        self.local.profile = profile
+        # tracemalloc wraps the collector: its snapshots stay out of the cpu
+        # profile and the collector's allocations are filtered out by module
+        snapshot = self.start_tracemalloc() if self.tracemalloc else None
+        if mode == 'cprofile':
+            collector = cProfile.Profile()
+            collector.enable()
+        else:
+            collector = Sampler(threading.get_ident(), profile.stacks, PROFILE_SAMPLE_INTERVAL)
+            collector.start()
+        start = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            profile.duration = time.perf_counter() - start
+            if mode == 'cprofile':
+                collector.disable()
+                self.cprofile_lock.release()
+            else:
+                collector.stop()
+            if snapshot is not None:
+                profile.allocations = self.stop_tracemalloc(snapshot)
+            if mode == 'cprofile':
+                profile.stats = marshal.dumps(pstats.Stats(collector).stats)
+            self.local.profile = None
+            self.profiles.append(profile)
+
+    def profile(self, view):
+        """
+        Decorator for views
+        """
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or not self.wanted():
+                return view(*args, **kwargs)
+            return self.run(view, *args, **kwargs)
+        return wrapper
+
+    def get(self, profile_id):
+        for profile in list(self.profiles):
+            if profile.id == profile_id:
+                return profile
+        return None
+
+
+profiler = Profiler()
@@ -0,0 +1,145 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, make_response, request
+
+from settings.constants import (RATE_LIMIT_ENABLED, RATE_LIMIT_RATE, RATE_LIMIT_CAPACITY, ROUTE_COSTS,
+                                MAX_IN_FLIGHT, SHED_RETRY_AFTER)
+
+
+class Backend(object):
+    """
+    Storage for token buckets
+
+    Subclass and implement `consume` to share buckets between workers
+    (e.g. in redis); it must be atomic for a single key.
+    """
+
+    def consume(self, key, cost, rate, capacity):
+        """
+        Take `cost` tokens from bucket `key`
+
+        key: bucket key
+        cost: tokens to take
+        rate: tokens refilled per second
+        capacity: bucket size
+        return: (allowed, seconds to wait before retry)
+        """
+        raise NotImplementedError
+
+
+class MemoryBackend(Backend):
+    """
+    Per-process token buckets
+
+    Buckets are kept in LRU order and the least recently used ones are
+    dropped above `max_keys` (a dropped bucket is the same as a full one).
+    """
+    max_keys = 10000
+
+    def __init__(self, max_keys=None):
+        if max_keys is not None:
+            self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> (tokens, last refill time)
+        self.lock = threading.Lock()
+
+    def consume(self, key, cost, rate, capacity):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        if allowed:
+            return True, 0
+        return False, (cost - tokens) / rate
+
+
+class LoadShedder(object):
+    """
+    Counter of weighted in-flight requests
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, weight):
+        """
+        Reserve `weight` units, return False if over the limit
+        """
+        with self.lock:
+            # always let a request through on an idle worker
+            if self.in_flight and self.in_flight + weight > self.limit:
+                return False
+            self.in_flight += weight
+            return True
+
+    def release(self, weight):
+        with self.lock:
+            self.in_flight -= weight
+
+
+class RateLimiter(object):
+    """
+    Token bucket rate limiting per client and route plus load shedding
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.shedder = LoadShedder(MAX_IN_FLIGHT)
+        self.enabled = RATE_LIMIT_ENABLED
+        self.rate = RATE_LIMIT_RATE
+        self.capacity = RATE_LIMIT_CAPACITY
+
+    def init_app(self, app):
+        """
+        Read settings from app config (keys are the same as in settings.constants)
+        """
+        self.backend = app.config.get('RATE_LIMIT_BACKEND', self.backend)
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', self.enabled)
+        self.rate = app.config.get('RATE_LIMIT_RATE', self.rate)
+        self.capacity = app.config.get('RATE_LIMIT_CAPACITY', self.capacity)
+        self.shedder.limit = app.config.get('MAX_IN_FLIGHT', self.shedder.limit)
+
+    def limit(self, view):
+        """
+        Decorator for views, cost of the view is taken from ROUTE_COSTS
+        """
+        cost = ROUTE_COSTS.get(view.__name__, 1)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.enabled:
+                key = '{}:{}'.format(request.remote_addr, request.endpoint)
+                allowed, retry_after = self.backend.consume(key, cost, self.rate, self.capacity)
+                if not allowed:
+                    err = 'Too many requests'
+                    response = make_response(jsonify(error=err), 429)
+                    response.headers['Retry-After'] = str(math.ceil(retry_after))
+                    return response
+
+            # load shedding is switched off separately (falsy MAX_IN_FLIGHT)
+            if not self.shedder.limit:
+                return view(*args, **kwargs)
+            if not self.shedder.acquire(cost):
+                err = 'Server is overloaded'
+                response = make_response(jsonify(error=err), 503)
+                response.headers['Retry-After'] = str(SHED_RETRY_AFTER)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.shedder.release(cost)
+        return wrapper
+
+
+limiter = RateLimiter()
@@ -1,29 +1,46 @@
-from flask import Flask, request
+from flask import Flask, jsonify, request
 from flask import current_app as app
 
 from controllers.actor import *
 from controllers.movie import *
+from controllers.profiling import *
+from .profiling import profiler
+from .ratelimit import limiter
+from .snapshot import Snapshot, snapshots
+
+actors_snapshot = Snapshot('actors', list_actors)
+movies_snapshot = Snapshot('movies', list_movies)
 
 
 @app.route('/api/actors', methods=['GET'])
+@limiter.limit
+@profiler.profile
 def actors():
     """
      Get all actors in db
     """
+    if actors_snapshot.enabled:
+        return actors_snapshot.response()
 
     return get_all_actors()
 
 
 @app.route('/api/movies', methods=['GET'])
+@limiter.limit
+@profiler.profile
 def movies():
     """
      Get all movies in db
     """
+    if movies_snapshot.enabled:
+        return movies_snapshot.response()
 
     return get_all_movies()
 
 
 @app.route('/api/actor', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@limiter.limit
+@profiler.profile
 def actor():
     if request.method == 'GET':
         return get_actor_by_id()
@@ -36,6 +53,8 @@ def actor():
 
 
 @app.route('/api/movie', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@limiter.limit
+@profiler.profile
 def movie():
     if request.method == 'GET':
         return get_movie_by_id()
@@ -48,6 +67,8 @@ def movie():
 
 
 @app.route('/api/actor-relations', methods=['PUT', 'DELETE'])
+@limiter.limit
+@profiler.profile
 def actor_relation():
     if request.method == 'PUT':
         return actor_add_relation()
@@ -56,8 +77,41 @@ def actor_relation():
 
 
 @app.route('/api/movie-relations', methods=['PUT', 'DELETE'])
+@limiter.limit
+@profiler.profile
 def movie_relation():
     if request.method == 'PUT':
         return movie_add_relation()
     elif request.method == 'DELETE':
         return movie_clear_relations()
+
+
+@app.route('/api/snapshots', methods=['GET'])
+@limiter.limit
+@profiler.profile
+def snapshot_stats():
+    """
+     Get rebuild cost and staleness of collection snapshots
+    """
+
+    return jsonify([snapshot.stats() for snapshot in snapshots.values()])
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@limiter.limit
+def profiles():
+    """
+     Get stored profiles (needs X-Admin-Token)
+    """
+
+    return get_profiles()
+
+
+@app.route('/api/admin/profile', methods=['GET'])
+@limiter.limit
+def profile():
+    """
+     Download profile as pstats or collapsed stacks (needs X-Admin-Token)
+    """
+
+    return download_profile()
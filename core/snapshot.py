@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import threading
+import time
+
+from flask import current_app, jsonify, request
+
+from settings.constants import SNAPSHOT_ENABLED, SNAPSHOT_GZIP, SNAPSHOT_GZIP_MIN_SIZE
+
+# tablename -> Snapshot
+snapshots = {}
+
+
+def mark_stale(tablename):
+    """
+    Write hook (see models.base.write_hooks)
+    """
+    snapshot = snapshots.get(tablename)
+    if snapshot is not None and snapshot.enabled:
+        snapshot.mark_stale()
+
+
+class Snapshot(object):
+    """
+    Pre-encoded (and optionally gzip-compressed) body of a full collection
+
+    Writes bump `generation` and start a background rebuild; a request that
+    finds the snapshot stale rebuilds it first, so it never serves data
+    older than the last write it could have seen.
+    """
+
+    def __init__(self, tablename, build):
+        """
+        tablename: table whose writes make the snapshot stale
+        build: function returning data to encode as json
+        """
+        self.tablename = tablename
+        self.build = build
+        self.enabled = current_app.config.get('SNAPSHOT_ENABLED', SNAPSHOT_ENABLED)
+        self.gzip = current_app.config.get('SNAPSHOT_GZIP', SNAPSHOT_GZIP)
+        self.gzip_min_size = current_app.config.get('SNAPSHOT_GZIP_MIN_SIZE', SNAPSHOT_GZIP_MIN_SIZE)
+
+        self.body = None
+        self.gzip_body = None
+        self.etag = None
+        self.generation = 0
+        self.built_generation = -1
+        self.built_at = None
+        self.stale_since = None
+        self.rebuilding = False
+
+        # metrics
+        self.rebuilds = 0
+        self.last_rebuild_seconds = 0.0
+        self.total_rebuild_seconds = 0.0
+
+        self.lock = threading.Lock()  # guards the fields above
+        self.build_lock = threading.Lock()  # one rebuild at a time
+        snapshots[tablename] = self
+
+    def mark_stale(self):
+        """
+        Mark snapshot stale and rebuild it in background
+        """
+        with self.lock:
+            self.generation += 1
+            if self.stale_since is None:
+                self.stale_since = time.monotonic()
+            start = self.body is not None and not self.rebuilding
+            if start:
+                self.rebuilding = True
+        if start:
+            app = current_app._get_current_object()
+            threading.Thread(target=self.rebuild_in_background, args=(app,), daemon=True).start()
+
+    def rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self.refresh()
+        finally:
+            with self.lock:
+                self.rebuilding = False
+
+    def refresh(self):
+        """
+        Rebuild body if it is older than the last write
+        """
+        with self.lock:
+            if self.built_generation == self.generation:
+                return
+        with self.build_lock:
+            with self.lock:
+                generation = self.generation
+                if self.built_generation == generation:
+                    return
+
+            start = time.perf_counter()
+            body = jsonify(self.build()).get_data()
+            gzip_body = gzip.compress(body) if self.gzip and len(body) >= self.gzip_min_size else None
+            etag = hashlib.sha1(body).hexdigest()
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.body = body
+                self.gzip_body = gzip_body
+                self.etag = etag
+                self.built_generation = generation
+                self.built_at = time.monotonic()
+                if self.generation == generation:
+                    self.stale_since = None
+                self.rebuilds += 1
+                self.last_rebuild_seconds = elapsed
+                self.total_rebuild_seconds += elapsed
+
+    def response(self):
+        """
+        Make response with the encoded body (304 if ETag matches)
+        """
+        self.refresh()
+        with self.lock:
+            body, gzip_body, etag = self.body, self.gzip_body, self.etag
+
+        if gzip_body is not None and 'gzip' in request.accept_encodings:
+            response = current_app.response_class(gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Content-Length'] = str(len(gzip_body))
+            etag += '-gzip'
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+            response.headers['Content-Length'] = str(len(body))
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    def stats(self):
+        """
+        Rebuild cost and staleness
+        """
+        now = time.monotonic()
+        with self.lock:
+            built = self.built_at is not None
+            stale = built and self.built_generation != self.generation
+            return {
+                'table': self.tablename,
+                'enabled': self.enabled,
+                'size': len(self.body) if self.body is not None else 0,
+                'gzip_size': len(self.gzip_body) if self.gzip_body is not None else 0,
+                'rebuilds': self.rebuilds,
+                'last_rebuild_ms': round(self.last_rebuild_seconds * 1000, 3),
+                'total_rebuild_ms': round(self.total_rebuild_seconds * 1000, 3),
+                'built': built,
+                'stale': stale,
+                'stale_seconds': round(now - self.stale_since, 3) if stale and self.stale_since is not None else 0,
+                'age_seconds': round(now - self.built_at, 3) if built else None,
+            }
@@ -16,6 +16,8 @@ class Actor(Model, db.Model):
     gender = db.Column(db.String(11))
     # date_of_birth -> date
     date_of_birth = db.Column(db.Date)
+    # version -> integer, bumped on every write (optimistic concurrency control)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # Use `db.relationship` method to define the Actor's relationship with Movie.
     # Set `backref` as 'cast', uselist=True
@@ -1,5 +1,23 @@
 from core import db
 
+# callbacks `hook(tablename)` run after every committed write
+write_hooks = []
+
+
+class VersionConflict(Exception):
+    """
+    Raised when a record was changed by someone else since it was read
+    """
+    pass
+
+
+def notify_write(cls):
+    """
+    Run write hooks for the table of cls
+    """
+    for hook in write_hooks:
+        hook(cls.__tablename__)
+
 
 def commit(obj):
     """
@@ -7,10 +25,66 @@ def commit(obj):
     """
     db.session.add(obj)
     db.session.commit()
+    notify_write(type(obj))
     db.session.refresh(obj)
     return obj
 
 
+def expire_versions(cls, row_ids):
+    """
+    Expire `version` of loaded instances after a bulk version bump
+
+    cls: class
+    row_ids: ids of bumped records
+    """
+    for row_id in row_ids:
+        obj = db.session.identity_map.get(db.session.identity_key(cls, row_id))
+        if obj is not None:
+            db.session.expire(obj, ['version'])
+
+
+def bump_version(cls, row_id, version=None):
+    """
+    Issue `UPDATE ... SET version = version + 1 WHERE id = ? [AND version = ?]`
+
+    cls: class
+    row_id: record id
+    version: expected record version, None skips the check
+    """
+    query = cls.query.filter_by(id=row_id)
+    if version is not None:
+        query = query.filter_by(version=version)
+    updated = query.update({'version': cls.version + 1}, synchronize_session=False)
+    if not updated:
+        db.session.rollback()
+        raise VersionConflict('Record was modified by another request')
+    expire_versions(cls, [row_id])
+    return updated
+
+
+def bump_related(rel_cls, row_ids):
+    """
+    Bump versions of the other side of changed relations (no version check)
+
+    rel_cls: class of related objects
+    row_ids: ids of related records
+    """
+    if not row_ids:
+        return
+    rel_cls.query.filter(rel_cls.id.in_(row_ids)).update(
+        {'version': rel_cls.version + 1}, synchronize_session=False)
+    expire_versions(rel_cls, row_ids)
+
+
+def commit_relations(obj, rel_cls):
+    """
+    Commit relation change, write hooks run for both tables
+    """
+    obj = commit(obj)
+    notify_write(rel_cls)
+    return obj
+
+
 class Model(object):
     @classmethod
     def create(cls, **kwargs):
@@ -26,16 +100,34 @@ class Model(object):
     @classmethod
     def update(cls, row_id, **kwargs):
         """
-        Update record by id
+        Update record by id with a single conditional UPDATE ... RETURNING
 
         cls: class
         row_id: record id
-        kwargs: dict with object parameters
+        kwargs: dict with object parameters, `version` (optional) is the
+                version the client has read, mismatch raises VersionConflict
+        return: updated object or None if there is no record with such id
         """
-        obj = cls.query.filter_by(id=row_id).first()
-        for key, value in kwargs.items():
-            setattr(obj, key, value)
-        return commit(obj)
+        version = kwargs.pop('version', None)
+        values = {k: v for k, v in kwargs.items() if k != 'id'}
+        values['version'] = cls.version + 1
+        query = db.update(cls).where(cls.id == row_id)
+        if version is not None:
+            query = query.where(cls.version == version)
+        query = query.values(**values).returning(cls).execution_options(
+            synchronize_session=False, populate_existing=True)
+        obj = db.session.execute(query).scalar_one_or_none()
+        if obj is None:
+            db.session.rollback()
+            # only look the record up to tell a missing one from a conflict
+            if version is None or cls.query.get(row_id) is None:
+                return None
+            raise VersionConflict('Record was modified by another request')
+        # keep the returned values, commit would expire them
+        db.session.expunge(obj)
+        db.session.commit()
+        notify_write(cls)
+        return obj
 
     @classmethod
     def delete(cls, row_id):
@@ -50,52 +142,71 @@ class Model(object):
         if obj:
             db.session.delete(obj)
             db.session.commit()
+            notify_write(cls)
             return 1
         return 0
 
     @classmethod
-    def add_relation(cls, row_id, rel_obj):
+    def add_relation(cls, row_id, rel_obj, version=None):
         """
         Add relation to object
 
         cls: class
         row_id: record id
         rel_obj: related object
+        version: expected record version (optional)
         """
+        # the association row belongs to both records
+        rel_cls, rel_id = type(rel_obj), rel_obj.id
+        bump_version(cls, row_id, version)
+        bump_related(rel_cls, [rel_id])
         obj = cls.query.get(row_id)
         if cls.__name__ == 'Actor':
             obj.filmography.append(rel_obj)
         elif cls.__name__ == 'Movie':
             obj.cast.append(rel_obj)
-        return commit(obj)
+        return commit_relations(obj, rel_cls)
 
     @classmethod
-    def remove_relation(cls, row_id, rel_obj):
+    def remove_relation(cls, row_id, rel_obj, version=None):
         """
         Remove certain relation
 
         cls: class
         row_id: record id
         rel_obj: related object
+        version: expected record version (optional)
         """
+        # the association row belongs to both records
+        rel_cls, rel_id = type(rel_obj), rel_obj.id
+        bump_version(cls, row_id, version)
+        bump_related(rel_cls, [rel_id])
         obj = cls.query.get(row_id)
         if cls.__name__ == 'Actor':
             obj.filmography.remove(rel_obj)
         elif cls.__name__ == 'Movie':
             obj.cast.remove(rel_obj)
-        return commit(obj)
+        return commit_relations(obj, rel_cls)
 
     @classmethod
-    def clear_relations(cls, row_id):
+    def clear_relations(cls, row_id, version=None):
         """
         Remove all relations by id
 
         cls: class
         row_id: record id
+        version: expected record version (optional)
         """
+        bump_version(cls, row_id, version)
         obj = cls.query.get(row_id)
         if cls.__name__ == 'Actor':
-            obj.filmography.clear()
+            relation = cls.filmography
         elif cls.__name__ == 'Movie':
-            obj.cast.clear()
-        return commit(obj)
\ No newline at end of file
+            relation = cls.cast
+        # the association rows belong to the related records too
+        rel_cls = relation.property.mapper.class_
+        related = getattr(obj, relation.key)
+        rel_ids = [rel_obj.id for rel_obj in related]
+        related.clear()
+        bump_related(rel_cls, rel_ids)
+        return commit_relations(obj, rel_cls)
\ No newline at end of file
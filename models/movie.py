@@ -16,6 +16,8 @@ class Movie(Model, db.Model):
     year = db.Column(db.Integer)
     # genre -> string, size 20
     genre = db.Column(db.String(20))
+    # version -> integer, bumped on every write (optimistic concurrency control)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     # Use `db.relationship` method to define the Movie's relationship with Actor.
     # Set `backref` as 'filmography', uselist=True
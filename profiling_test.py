@@ -0,0 +1,67 @@
+import json
+import marshal
+import time
+
+import pytest
+
+import core.profiling
+from core.profiling import Profiler
+
+
+@pytest.fixture
+def profiler(app):
+    profiler = Profiler()
+    profiler.enabled = True
+    profiler.sample_rate = 1.0
+    return profiler
+
+
+def allocate():
+    return [bytearray(1024) for _ in range(200)]
+
+
+def test_allocations_leave_out_profiler(app, profiler):
+    profiler.tracemalloc = True
+    view = profiler.profile(allocate)
+    with app.test_request_context():
+        view()
+    profile = profiler.profiles[-1]
+    assert profile.allocations
+    assert 'profiling_test.py' in profile.allocations[0]['location']
+    for allocation in profile.allocations:
+        assert 'core/profiling.py' not in allocation['location']
+    # tracemalloc work stays out of the cpu profile
+    stats = marshal.loads(profile.stats)
+    assert stats
+    for filename, line, name in stats:
+        assert not filename.endswith('tracemalloc.py')
+
+
+def slow_view():
+    time.sleep(0.05)
+
+
+def test_sampled_stacks_contain_view(app, profiler):
+    profiler.mode = 'sampling'
+    view = profiler.profile(slow_view)
+    with app.test_request_context():
+        view()
+    profile = profiler.profiles[-1]
+    assert profile.mode == 'sampling'
+    assert ':slow_view:' in profile.collapsed()
+
+
+def test_fast_view_has_no_samples(app, profiler, monkeypatch):
+    profiler.mode = 'sampling'
+    view = profiler.profile(lambda: None)
+    with app.test_request_context():
+        view()
+    profile = profiler.profiles[-1]
+    assert not profile.stacks
+
+    monkeypatch.setattr(core.profiling.profiler, 'admin_token', 'secret')
+    monkeypatch.setattr(core.profiling.profiler, 'profiles', profiler.profiles)
+    response = app.test_client().get('/api/admin/profile', data={'id': profile.id, 'format': 'collapsed'},
+                                     headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 400
+    assert json.loads(response.data)['error'] == 'Profile has no samples'
@@ -0,0 +1,71 @@
+import pytest
+
+from core.ratelimit import MemoryBackend, limiter
+from settings.constants import SHED_RETRY_AFTER
+
+
+def test_memory_backend_is_bounded():
+    backend = MemoryBackend(max_keys=100)
+    for i in range(1000):
+        assert backend.consume('client-{}'.format(i), 1, 10, 20) == (True, 0)
+    assert len(backend.buckets) == 100
+    # most recent clients are kept
+    assert 'client-999' in backend.buckets
+    assert 'client-0' not in backend.buckets
+
+
+def test_memory_backend_denies_when_empty():
+    backend = MemoryBackend()
+    assert backend.consume('client', 20, 1, 20) == (True, 0)
+    allowed, retry_after = backend.consume('client', 5, 1, 20)
+    assert not allowed
+    assert 0 < retry_after <= 5
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(limiter, 'enabled', True)
+    monkeypatch.setattr(limiter, 'backend', MemoryBackend())
+    monkeypatch.setattr(limiter, 'rate', 0.1)
+    monkeypatch.setattr(limiter, 'capacity', 5)
+    return limiter
+
+
+def test_rate_limit_returns_429(app, limited):
+    client = app.test_client()
+    for _ in range(5):
+        assert client.get('/api/movie', data={'id': 1}).status_code != 429
+    response = client.get('/api/movie', data={'id': 1})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+
+def test_full_lists_cost_more_than_id_lookups(app, limited):
+    client = app.test_client()
+    # capacity 5: one full list (cost 5) vs five id lookups (cost 1)
+    assert client.get('/api/movies').status_code == 200
+    assert client.get('/api/movies').status_code == 429
+    for _ in range(5):
+        assert client.get('/api/actor', data={'id': 1}).status_code != 429
+    assert client.get('/api/actor', data={'id': 1}).status_code == 429
+
+
+def test_load_shedding_returns_503(app, monkeypatch):
+    # works with rate limiting off, as in the test app
+    assert not limiter.enabled
+    monkeypatch.setattr(limiter.shedder, 'limit', 3)
+    monkeypatch.setattr(limiter.shedder, 'in_flight', 3)
+    response = app.test_client().get('/api/movie', data={'id': 1})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(SHED_RETRY_AFTER)
+    assert limiter.shedder.in_flight == 3
+
+
+def test_load_shedding_counts_route_cost(app, monkeypatch):
+    monkeypatch.setattr(limiter.shedder, 'limit', 5)
+    monkeypatch.setattr(limiter.shedder, 'in_flight', 1)
+    client = app.test_client()
+    # 1 + 5 is over the limit, 1 + 1 is not
+    assert client.get('/api/movies').status_code == 503
+    assert client.get('/api/movie', data={'id': 1}).status_code != 503
+    assert limiter.shedder.in_flight == 1
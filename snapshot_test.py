@@ -0,0 +1,74 @@
+import json
+
+from core.snapshot import Snapshot, snapshots
+
+
+def make_snapshot(app, data):
+    with app.app_context():
+        snapshot = Snapshot('snapshot_test', lambda: data)
+    snapshots.pop('snapshot_test')
+    return snapshot
+
+
+def test_fresh_snapshot_does_not_wait_for_rebuild(app):
+    snapshot = make_snapshot(app, [{'id': 1}])
+    with app.app_context():
+        snapshot.refresh()
+        assert snapshot.rebuilds == 1
+        # a rebuild in progress must not block readers of a fresh snapshot
+        with snapshot.build_lock:
+            snapshot.refresh()
+        assert snapshot.rebuilds == 1
+
+
+def test_small_body_is_not_gzipped(app):
+    snapshot = make_snapshot(app, [{'id': 1}])
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = snapshot.response()
+    assert snapshot.gzip_body is None
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Content-Length'] == str(len(snapshot.body))
+
+
+def test_large_body_is_gzipped(app):
+    snapshot = make_snapshot(app, [{'id': i, 'name': 'Movie {}'.format(i)} for i in range(100)])
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = snapshot.response()
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Length'] == str(len(snapshot.gzip_body))
+    assert len(snapshot.gzip_body) < len(snapshot.body)
+
+
+def test_stats_of_cold_snapshot(app):
+    snapshot = make_snapshot(app, [])
+    stats = snapshot.stats()
+    assert not stats['built']
+    assert not stats['stale']
+    with app.app_context():
+        snapshot.refresh()
+    stats = snapshot.stats()
+    assert stats['built']
+    assert not stats['stale']
+
+
+def test_write_refreshes_collection_snapshot(app, monkeypatch):
+    # routes are imported by create_app, inside an app context
+    from core.routes import movies_snapshot
+    monkeypatch.setattr(movies_snapshot, 'enabled', True)
+    client = app.test_client()
+
+    response = client.get('/api/movies')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get('/api/movies', headers={'If-None-Match': etag}).status_code == 304
+
+    # a write through models.base marks the snapshot stale
+    generation = movies_snapshot.generation
+    assert client.post('/api/movie', data={'name': 'Snapshot 1', 'year': 2003, 'genre': 'drama'}).status_code == 200
+    assert movies_snapshot.generation == generation + 1
+
+    response = client.get('/api/movies', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Snapshot 1' in [movie['name'] for movie in json.loads(response.data)]
+    assert response.headers['Content-Length'] == str(len(response.data))
@@ -0,0 +1,83 @@
+import json
+import warnings
+
+from sqlalchemy import event
+
+from core import db
+from models.actor import Actor
+from models.movie import Movie
+
+
+def create_movie(app, name):
+    with app.app_context():
+        movie = Movie.create(name=name, year=2000, genre='drama')
+        return movie.id, movie.version
+
+
+def test_update_with_current_version(app):
+    movie_id, version = create_movie(app, 'Versioned 1')
+    with app.app_context():
+        engine = db.engine
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().put('/api/movie', data={'id': movie_id, 'year': 2001, 'version': version})
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    # one conditional UPDATE ... RETURNING, no SELECTs
+    assert len(statements) == 1
+    assert statements[0].startswith('UPDATE')
+    body = json.loads(response.data)
+    assert body['year'] == 2001
+    assert body['version'] == version + 1
+    assert response.headers['ETag'] == '"{}"'.format(version + 1)
+
+
+def test_update_with_stale_version(app):
+    movie_id, version = create_movie(app, 'Versioned 2')
+    client = app.test_client()
+    assert client.put('/api/movie', data={'id': movie_id, 'year': 2001}).status_code == 200
+    response = client.put('/api/movie', data={'id': movie_id, 'year': 2002},
+                          headers={'If-Match': '"{}"'.format(version)})
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(Movie, movie_id).year == 2001
+
+
+def test_update_missing_record(app):
+    response = app.test_client().put('/api/movie', data={'id': 100000, 'year': 2001, 'version': 1})
+    assert response.status_code == 400
+
+
+def test_relation_bumps_both_sides(app):
+    with app.app_context():
+        movie = Movie.create(name='Versioned 3', year=2000, genre='drama')
+        actor = Actor.create(name='Versioned Actor', gender='female')
+        movie_id, movie_version = movie.id, movie.version
+        actor_id, actor_version = actor.id, actor.version
+
+    client = app.test_client()
+    response = client.put('/api/actor-relations',
+                          data={'id': actor_id, 'relation_id': movie_id, 'version': actor_version})
+    assert response.status_code == 200
+    assert json.loads(response.data)['version'] == actor_version + 1
+
+    # movie has changed too, its old version is stale now
+    response = client.delete('/api/movie-relations', data={'id': movie_id, 'version': movie_version})
+    assert response.status_code == 409
+    with app.app_context():
+        movie_version = db.session.get(Movie, movie_id).version
+        actor_version = db.session.get(Actor, actor_id).version
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        response = client.delete('/api/movie-relations', data={'id': movie_id, 'version': movie_version})
+    assert response.status_code == 200
+    assert not [w for w in caught if 'invalidated' in str(w.message)]
+    with app.app_context():
+        assert db.session.get(Actor, actor_id).version == actor_version + 1
+        assert db.session.get(Movie, movie_id).cast == []